@@ -0,0 +1,113 @@
+from functools import lru_cache
+import warnings
+from obspy.core import Stream
+from obspy.core.util.base import _get_function_from_entry_point
+from scipy.signal import iirfilter, zpk2sos, sosfilt
+import numpy as np
+from config import *
+
+def can_stack_stream(stream: Stream) -> bool:
+    # the array processing needs components of the same sampling rate and length
+    first_stats = stream.traces[0].stats
+    return all(
+        tr.stats.sampling_rate == first_stats.sampling_rate and tr.stats.npts == first_stats.npts
+        for tr in stream.traces
+    )
+
+def stream_to_array(stream: Stream) -> np.ndarray:
+    # stack the components into an (n_components, npts) float64 array
+    if not can_stack_stream(stream):
+        raise ValueError("All the components must share the same sampling rate and number of samples!")
+
+    return np.vstack([np.require(tr.data, dtype=np.float64) for tr in stream.traces])
+
+def array_to_stream(data: np.ndarray, stream: Stream) -> Stream:
+    for i, tr in enumerate(stream.traces):
+        tr.data = data[i]
+    return stream
+
+@lru_cache(maxsize=None)
+def design_filter_sos(filter_type: str, fs: float, freqmin: float, freqmax: float, corners: int) -> np.ndarray:
+    # same design (and Nyquist fallbacks) as obspy.signal.filter, computed once per configuration
+    fe = 0.5 * fs
+
+    if filter_type == "bandpass":
+        low = freqmin / fe
+        high = freqmax / fe
+        if high - 1.0 > -1e-6:
+            warnings.warn(f"Selected high corner frequency ({freqmax}) of bandpass is at or above Nyquist ({fe}). Applying a high-pass instead.")
+            return design_filter_sos("highpass", fs, freqmin, freqmax, corners)
+        if low > 1:
+            raise ValueError("Selected low corner frequency is above Nyquist.")
+        z, p, k = iirfilter(corners, [low, high], btype="band", ftype="butter", output="zpk")
+    elif filter_type == "highpass":
+        f = freqmin / fe
+        if f > 1:
+            raise ValueError("Selected corner frequency is above Nyquist.")
+        z, p, k = iirfilter(corners, f, btype="highpass", ftype="butter", output="zpk")
+    elif filter_type == "lowpass":
+        f = freqmax / fe
+        if f > 1:
+            f = 1.0
+            warnings.warn(f"Selected corner frequency ({freqmax}) is above Nyquist ({fe}). Setting Nyquist as high corner.")
+        z, p, k = iirfilter(corners, f, btype="lowpass", ftype="butter", output="zpk")
+    else:
+        raise ValueError(f"Unsupported filter type '{filter_type}'!")
+
+    return zpk2sos(z, p, k)
+
+def filter_array(data: np.ndarray, fs: float, zerophase: bool = False) -> np.ndarray:
+    sos = design_filter_sos(
+        AppParameters.FILTER_TYPE.value,
+        float(fs),
+        AppParameters.FILTER_FREQ_MIN.value,
+        AppParameters.FILTER_FREQ_MAX.value,
+        AppParameters.FILTER_CORNERS.value
+    )
+
+    if zerophase:
+        # forward and backward pass exactly like ObsPy (no edge padding as in sosfiltfilt)
+        firstpass = sosfilt(sos, data, axis=-1)
+        return sosfilt(sos, firstpass[..., ::-1], axis=-1)[..., ::-1]
+
+    return sosfilt(sos, data, axis=-1)
+
+@lru_cache(maxsize=None)
+def design_taper(npts: int, fs: float, taper_type: str, max_length: float, side: str) -> np.ndarray:
+    # same window as obspy.core.Trace.taper with max_percentage=None
+    taper_type = taper_type.lower()
+    side = side.lower()
+    if side not in ["both", "left", "right"]:
+        raise ValueError(f"Unsupported taper side '{side}'!")
+
+    max_half_lengths = [int(max_length * fs), int(npts / 2)]
+    wlen = min(max_half_lengths)
+
+    # the taper names are resolved by ObsPy (e.g. "cosine" is obspy.signal.invsim.cosine_taper)
+    window_function = _get_function_from_entry_point("taper", taper_type)
+    kwargs = {"p": 1.0} if taper_type == "cosine" else {}
+    if 2 * wlen == npts:
+        taper_sides = window_function(2 * wlen, **kwargs)
+    else:
+        taper_sides = window_function(2 * wlen + 1, **kwargs)
+
+    if side == "left":
+        taper = np.hstack((taper_sides[:wlen], np.ones(npts - wlen)))
+    elif side == "right":
+        taper = np.hstack((np.ones(npts - wlen), taper_sides[len(taper_sides) - wlen:]))
+    else:
+        taper = np.hstack((taper_sides[:wlen], np.ones(npts - 2 * wlen), taper_sides[len(taper_sides) - wlen:]))
+
+    taper.flags.writeable = False
+    return taper
+
+def taper_array(data: np.ndarray, fs: float) -> np.ndarray:
+    taper = design_taper(
+        data.shape[-1],
+        float(fs),
+        AppParameters.TAPER_TYPE.value,
+        AppParameters.TAPER_MAX_LENGTH.value,
+        AppParameters.TAPER_SIDE.value
+    )
+    data *= taper
+    return data
@@ -0,0 +1,145 @@
+from pathlib import Path
+from itertools import islice
+import sqlite3
+from obspy import read as read_mseed
+from obspy.core import UTCDateTime
+import functions
+from config import *
+
+# header-only index of the data folder, stored in SQLite and updated incrementally
+TXT_HEADER_TOTAL_LINES = 8
+
+CREATE_TABLE_QUERY = """
+CREATE TABLE IF NOT EXISTS records (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    format TEXT NOT NULL,
+    station TEXT,
+    starttime TEXT NOT NULL,
+    starttime_timestamp REAL NOT NULL,
+    sampling_rate REAL NOT NULL,
+    npts INTEGER NOT NULL,
+    components TEXT NOT NULL
+)
+"""
+
+def connect_catalog(catalog_file_path: Path = AppRoutes.CATALOG_FILE_PATH.value) -> sqlite3.Connection:
+    connection = sqlite3.connect(catalog_file_path)
+    connection.row_factory = sqlite3.Row
+    connection.execute(CREATE_TABLE_QUERY)
+    connection.execute("CREATE INDEX IF NOT EXISTS records_station ON records (station, starttime_timestamp)")
+    connection.execute("CREATE INDEX IF NOT EXISTS records_layout ON records (sampling_rate, npts)")
+    return connection
+
+def read_record_header(seismic_file: Path) -> tuple:
+    # reads the header without touching the samples
+    try:
+        if seismic_file.suffix.lower() == ".txt":
+            with open(seismic_file, "r") as file:
+                header = functions.parse_txt_header(list(islice(file, TXT_HEADER_TOTAL_LINES)))
+            header["format"] = "TXT"
+            return header, None
+
+        stream = read_mseed(str(seismic_file), headonly=True)
+        if len(stream.traces) == 0:
+            return None, "No traces found in the seismic file!"
+
+        first_stats = stream.traces[0].stats
+        return {
+            "station": first_stats.station,
+            "starttime": first_stats.starttime,
+            "sampling_rate": first_stats.sampling_rate,
+            "npts": first_stats.npts,
+            "components": [tr.stats.component for tr in stream.traces],
+            "format": "MSEED"
+        }, None
+    except Exception as e:
+        return None, str(e)
+
+def update_catalog(data_folder_path: Path = AppRoutes.DATA_FOLDER_PATH.value, catalog_file_path: Path = AppRoutes.CATALOG_FILE_PATH.value) -> tuple:
+    # only new or modified files are read, removed files are dropped from the index
+    try:
+        connection = connect_catalog(catalog_file_path)
+    except Exception as e:
+        return None, f"Cannot open the catalog '{catalog_file_path}': {str(e)}"
+
+    summary = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0, "errors": []}
+
+    with connection:
+        indexed = {
+            row["path"]: (row["mtime"], row["size"])
+            for row in connection.execute("SELECT path, mtime, size FROM records")
+        }
+
+        found = set()
+        for seismic_file in sorted(Path(data_folder_path).iterdir()):
+            if not seismic_file.is_file():
+                continue
+
+            path = str(seismic_file.resolve())
+            found.add(path)
+            file_stats = seismic_file.stat()
+
+            if indexed.get(path) == (file_stats.st_mtime, file_stats.st_size):
+                summary["unchanged"] += 1
+                continue
+
+            header, error = read_record_header(seismic_file)
+            if error is not None:
+                summary["errors"].append(f"Cannot read the header of '{seismic_file}': {error}")
+                continue
+
+            connection.execute(
+                "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    path,
+                    file_stats.st_mtime,
+                    file_stats.st_size,
+                    header["format"],
+                    header["station"],
+                    str(header["starttime"]),
+                    header["starttime"].timestamp,
+                    header["sampling_rate"],
+                    header["npts"],
+                    " ".join(header["components"])
+                )
+            )
+            summary["updated" if path in indexed else "added"] += 1
+
+        for path in set(indexed) - found:
+            connection.execute("DELETE FROM records WHERE path = ?", (path,))
+            summary["removed"] += 1
+
+    connection.close()
+    return summary, None
+
+def select_records(catalog_file_path: Path = AppRoutes.CATALOG_FILE_PATH.value, station: str | None = None, starttime: UTCDateTime | None = None, endtime: UTCDateTime | None = None) -> list:
+    query = "SELECT * FROM records WHERE 1 = 1"
+    params = []
+
+    if station is not None:
+        query += " AND station = ?"
+        params.append(station)
+
+    if starttime is not None:
+        query += " AND starttime_timestamp >= ?"
+        params.append(UTCDateTime(starttime).timestamp)
+
+    if endtime is not None:
+        query += " AND starttime_timestamp <= ?"
+        params.append(UTCDateTime(endtime).timestamp)
+
+    query += " ORDER BY starttime_timestamp, path"
+
+    connection = connect_catalog(catalog_file_path)
+    rows = [dict(row) for row in connection.execute(query, params)]
+    connection.close()
+    return rows
+
+def group_records(records: list) -> dict:
+    # records sharing sampling rate and length can be processed as one batch
+    groups = {}
+    for record in records:
+        groups.setdefault((record["sampling_rate"], record["npts"]), []).append(record)
+    return groups
@@ -7,6 +7,11 @@ import os
 class AppRoutes(Enum):
     ROOT_DIR_PATH = Path(__file__).parent.parent
     DATA_FOLDER_PATH = ROOT_DIR_PATH / "data"
+    STORE_FOLDER_PATH = ROOT_DIR_PATH / "store"
+    CATALOG_FILE_PATH = ROOT_DIR_PATH / "catalog.sqlite"
+    QUEUE_FILE_PATH = ROOT_DIR_PATH / "queue.sqlite"
+    QUEUE_FOLDER_PATH = ROOT_DIR_PATH / "queue"
+    RESULTS_FOLDER_PATH = ROOT_DIR_PATH / "results"
 
 class AppConfig(Enum):
     LOG_FILE_PATH = "app.log"
@@ -31,6 +36,19 @@ class AppParameters(Enum):
     RESPONSE_SPECTRA_MAX_PERIOD = 20
     RESPONSE_SPECTRA_TOTAL_PERIODS = 300
     RESPONSE_SPECTRA_DUMPING = 0.05
+    COMPUTE_ROTD = False
+    ROTD_ANGLE_STEP = 1
+    ROTD_MAX_HISTORY_ELEMENTS = 2 ** 22
+    PIPELINE_COMPUTE_WORKERS = 2
+    PIPELINE_MAX_RECORDS_IN_FLIGHT = 4
+    PLOT_RASTER_DPI = 200
+    QUEUE_LEASE_SECONDS = 60
+    QUEUE_MAX_ATTEMPTS = 3
+    SERVICE_HOST = "127.0.0.1"
+    SERVICE_PORT = 8050
+    SERVICE_MAX_CONCURRENT_REQUESTS = 2
+    SERVICE_LATENCY_SAMPLES = 1000
+    SERVICE_WARM_SAMPLING_RATES = (100, 200)
 
 def setup_environment():
     if not os.path.exists(AppRoutes.DATA_FOLDER_PATH.value):
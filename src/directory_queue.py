@@ -0,0 +1,235 @@
+from pathlib import Path
+import hashlib
+import json
+import os
+import threading
+import time
+import job_queue
+from config import *
+
+# Job queue in a shared directory (NFS/SMB), for workers on several machines. Nothing
+# relies on file locks, a job is claimed by creating its next attempt file with
+# O_CREAT|O_EXCL, which only one worker can do:
+#   jobs/<id>.json               record path, written once by enqueue_records
+#   leases/<id>.<attempt>.json   worker, status and lease expiry of each attempt
+#   done/<id>.json, failed/<id>.json
+# The worker of the latest attempt rewrites its lease file (heartbeat), an expired or
+# failed attempt is claimed again with attempt + 1. The lease must be longer than the
+# clock difference of the machines.
+JOB_FOLDERS = ["jobs", "leases", "done", "failed"]
+
+def create_queue_folder(queue_folder_path: Path = AppRoutes.QUEUE_FOLDER_PATH.value) -> Path:
+    queue_folder_path = Path(queue_folder_path)
+    for folder in JOB_FOLDERS:
+        (queue_folder_path / folder).mkdir(parents=True, exist_ok=True)
+    return queue_folder_path
+
+def get_job_id(path: str) -> str:
+    # the records must be reachable with the same path from every machine
+    return hashlib.sha1(path.encode("utf-8")).hexdigest()
+
+def _create_file(file_path: Path, content: dict) -> bool:
+    # returns False when the file already exists (another worker created it first)
+    try:
+        fd = os.open(file_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, "w") as file:
+        json.dump(content, file)
+    return True
+
+def _replace_file(file_path: Path, content: dict) -> None:
+    temporary_path = file_path.with_name(f".{file_path.name}.{job_queue.get_worker_id()}")
+    with open(temporary_path, "w") as file:
+        json.dump(content, file)
+    os.replace(temporary_path, file_path)
+
+def _read_file(file_path: Path) -> dict | None:
+    # None while the file is missing or still being written by its creator
+    try:
+        with open(file_path, "r") as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def _get_lease_path(queue_folder_path: Path, job_id: str, attempt: int) -> Path:
+    return Path(queue_folder_path) / "leases" / f"{job_id}.{attempt}.json"
+
+def _get_latest_attempt(queue_folder_path: Path, job_id: str) -> int:
+    attempt = 0
+    while _get_lease_path(queue_folder_path, job_id, attempt + 1).exists():
+        attempt += 1
+    return attempt
+
+def _read_lease(queue_folder_path: Path, job_id: str, attempt: int, lease_seconds: float) -> dict:
+    lease_path = _get_lease_path(queue_folder_path, job_id, attempt)
+    lease = _read_file(lease_path)
+    if lease is None:
+        # just created by its worker, the lease starts at the creation of the file
+        try:
+            lease = {"status": "running", "lease_expires": lease_path.stat().st_mtime + lease_seconds}
+        except FileNotFoundError:
+            lease = {"status": "running", "lease_expires": time.time() + lease_seconds}
+    return lease
+
+def _is_finished(queue_folder_path: Path, job_id: str) -> bool:
+    return any((Path(queue_folder_path) / folder / f"{job_id}.json").exists() for folder in ["done", "failed"])
+
+def enqueue_records(seismic_files: list, queue_folder_path: Path = AppRoutes.QUEUE_FOLDER_PATH.value) -> int:
+    # records already in the queue keep their status, so enqueueing again is safe
+    queue_folder_path = create_queue_folder(queue_folder_path)
+    total_added = 0
+    for seismic_file in seismic_files:
+        path = str(Path(seismic_file).resolve())
+        job = {"path": path, "enqueued_at": time.time()}
+        total_added += int(_create_file(queue_folder_path / "jobs" / f"{get_job_id(path)}.json", job))
+    return total_added
+
+def claim_job(queue_folder_path: Path, worker_id: str, lease_seconds: float = AppParameters.QUEUE_LEASE_SECONDS.value, max_attempts: int = AppParameters.QUEUE_MAX_ATTEMPTS.value) -> tuple | None:
+    # returns (path, job_id, attempt) of the claimed job, None when nothing is left to run
+    queue_folder_path = Path(queue_folder_path)
+    jobs = []
+    for job_path in (queue_folder_path / "jobs").glob("*.json"):
+        job = _read_file(job_path)
+        if job is not None:
+            jobs.append((job["enqueued_at"], job["path"], job_path.stem))
+
+    for _, path, job_id in sorted(jobs):
+        if _is_finished(queue_folder_path, job_id):
+            continue
+
+        now = time.time()
+        attempt = _get_latest_attempt(queue_folder_path, job_id)
+        if attempt > 0:
+            lease = _read_lease(queue_folder_path, job_id, attempt, lease_seconds)
+            if lease["status"] == "running" and lease["lease_expires"] >= now:
+                continue
+
+            if attempt >= max_attempts:
+                # the worker died or failed on the last attempt, the job will not run again
+                error = lease.get("error") or "The lease expired before the job was completed"
+                _create_file(queue_folder_path / "failed" / f"{job_id}.json", {"path": path, "attempts": attempt, "error": error, "finished_at": now})
+                continue
+
+        lease = {"worker": worker_id, "status": "running", "lease_expires": now + lease_seconds, "started_at": now}
+        if _create_file(_get_lease_path(queue_folder_path, job_id, attempt + 1), lease):
+            return path, job_id, attempt + 1
+
+    return None
+
+def _owns_job(queue_folder_path: Path, job_id: str, attempt: int) -> bool:
+    # the lease is lost once another worker has claimed a newer attempt
+    return not _get_lease_path(queue_folder_path, job_id, attempt + 1).exists() and not _is_finished(queue_folder_path, job_id)
+
+def heartbeat_job(queue_folder_path: Path, job_id: str, attempt: int, worker_id: str, lease_seconds: float = AppParameters.QUEUE_LEASE_SECONDS.value) -> bool:
+    # returns False when the lease has been lost (expired and claimed by another worker)
+    if not _owns_job(queue_folder_path, job_id, attempt):
+        return False
+    lease_path = _get_lease_path(queue_folder_path, job_id, attempt)
+    lease = _read_file(lease_path) or {"worker": worker_id, "started_at": time.time()}
+    _replace_file(lease_path, {**lease, "status": "running", "lease_expires": time.time() + lease_seconds})
+    return True
+
+def complete_job(queue_folder_path: Path, path: str, job_id: str, attempt: int, worker_id: str, result_path: str) -> bool:
+    if not _owns_job(queue_folder_path, job_id, attempt):
+        return False
+    done = {"path": path, "worker": worker_id, "attempts": attempt, "result_path": result_path, "finished_at": time.time()}
+    return _create_file(Path(queue_folder_path) / "done" / f"{job_id}.json", done)
+
+def fail_job(queue_folder_path: Path, path: str, job_id: str, attempt: int, worker_id: str, error: str, max_attempts: int = AppParameters.QUEUE_MAX_ATTEMPTS.value) -> bool:
+    # the job is claimed again until it runs out of attempts
+    if not _owns_job(queue_folder_path, job_id, attempt):
+        return False
+    lease_path = _get_lease_path(queue_folder_path, job_id, attempt)
+    lease = _read_file(lease_path) or {"worker": worker_id}
+    _replace_file(lease_path, {**lease, "status": "failed", "error": error, "lease_expires": None, "finished_at": time.time()})
+    if attempt >= max_attempts:
+        _create_file(Path(queue_folder_path) / "failed" / f"{job_id}.json", {"path": path, "attempts": attempt, "error": error, "finished_at": time.time()})
+    return True
+
+def _heartbeat_loop(queue_folder_path: Path, job_id: str, attempt: int, worker_id: str, lease_seconds: float, stop_event: threading.Event) -> None:
+    while not stop_event.wait(lease_seconds / 3):
+        if not heartbeat_job(queue_folder_path, job_id, attempt, worker_id, lease_seconds):
+            break
+
+def run_worker(queue_folder_path: Path = AppRoutes.QUEUE_FOLDER_PATH.value, results_folder_path: Path = AppRoutes.RESULTS_FOLDER_PATH.value, lease_seconds: float = AppParameters.QUEUE_LEASE_SECONDS.value, max_attempts: int = AppParameters.QUEUE_MAX_ATTEMPTS.value, worker_id: str | None = None) -> int:
+    # claims jobs until the queue has nothing left to run, returns the number of completed jobs
+    worker_id = worker_id or job_queue.get_worker_id()
+    queue_folder_path = create_queue_folder(queue_folder_path)
+    total_done = 0
+
+    while True:
+        job = claim_job(queue_folder_path, worker_id, lease_seconds, max_attempts)
+        if job is None:
+            break
+
+        path, job_id, attempt = job
+        handle_info(f"{worker_id} processing: {path}...")
+        stop_event = threading.Event()
+        heartbeat = threading.Thread(target=_heartbeat_loop, args=(queue_folder_path, job_id, attempt, worker_id, lease_seconds, stop_event), daemon=True)
+        heartbeat.start()
+
+        try:
+            result_path, error = job_queue.process_job(path, results_folder_path)
+        except Exception as e:
+            result_path, error = None, str(e)
+        finally:
+            stop_event.set()
+            heartbeat.join()
+
+        if error is not None:
+            handle_error(f"Cannot process '{path}': {error}")
+            fail_job(queue_folder_path, path, job_id, attempt, worker_id, error, max_attempts)
+        elif complete_job(queue_folder_path, path, job_id, attempt, worker_id, str(result_path)):
+            total_done += 1
+        else:
+            handle_error(f"The lease of '{path}' was lost, the result of {worker_id} is discarded")
+
+    return total_done
+
+def get_queue_stats(queue_folder_path: Path = AppRoutes.QUEUE_FOLDER_PATH.value, lease_seconds: float = AppParameters.QUEUE_LEASE_SECONDS.value, window_seconds: float = 60) -> dict:
+    # same fields as job_queue.get_queue_stats, safe to call while the workers are running
+    queue_folder_path = create_queue_folder(queue_folder_path)
+    now = time.time()
+
+    counts = {"pending": 0, "running": 0, "done": 0, "failed": 0}
+    durations = []
+    errors = []
+    for job_path in sorted((queue_folder_path / "jobs").glob("*.json")):
+        job_id = job_path.stem
+        done = _read_file(queue_folder_path / "done" / f"{job_id}.json")
+        failed = _read_file(queue_folder_path / "failed" / f"{job_id}.json")
+        attempt = _get_latest_attempt(queue_folder_path, job_id)
+        lease = _read_lease(queue_folder_path, job_id, attempt, lease_seconds) if attempt > 0 else None
+
+        if done is not None:
+            counts["done"] += 1
+            if done["finished_at"] >= now - window_seconds:
+                started_at = _read_lease(queue_folder_path, job_id, done["attempts"], lease_seconds).get("started_at")
+                if started_at is not None:
+                    durations.append(done["finished_at"] - started_at)
+            continue
+
+        if failed is not None:
+            counts["failed"] += 1
+            errors.append({"path": failed["path"], "status": "failed", "attempts": failed["attempts"], "error": failed["error"]})
+            continue
+
+        if lease is not None and lease["status"] == "running" and lease["lease_expires"] >= now:
+            counts["running"] += 1
+        else:
+            counts["pending"] += 1
+        if lease is not None and lease.get("error") is not None:
+            job = _read_file(job_path) or {"path": None}
+            errors.append({"path": job["path"], "status": "pending", "attempts": attempt, "error": lease["error"]})
+
+    throughput = len(durations) / window_seconds
+    remaining = counts["pending"] + counts["running"]
+    return {
+        **counts,
+        "total": sum(counts.values()),
+        "throughput_per_minute": throughput * 60,
+        "mean_job_seconds": sum(durations) / len(durations) if len(durations) > 0 else None,
+        "eta_seconds": remaining / throughput if throughput > 0 else None,
+        "errors": errors
+    }
@@ -1,11 +1,14 @@
 from pathlib import Path 
+from functools import lru_cache
 from obspy.core import Stream, Trace, UTCDateTime
-from obspy.signal.konnoohmachismoothing import konno_ohmachi_smoothing
+from obspy.signal.konnoohmachismoothing import calculate_smoothing_matrix
 import pandas as pd 
 import numpy as np
 from config import *
 import utilities
+import array_processing
 from response_spectra_scripts.response_spectrum import NigamJennings, plot_response_spectra, plot_time_series
+from response_spectra_scripts.sm_utils import get_rotated_peak_response
 
 def get_record_arrivals(stream: Stream) -> tuple:
     arrivals = {
@@ -25,34 +28,51 @@ def get_record_arrivals(stream: Stream) -> tuple:
     
     return record_arrivals, error_message
 
+def parse_txt_header(header_lines: list) -> dict:
+    # lines 1-8 of the TXT format
+    station = header_lines[1].strip().split(":")[1].strip()
+    starttime = UTCDateTime(header_lines[2].strip().split(":", 1)[1])
+    fs = float(header_lines[3].split(":")[1].strip(" HhZz\n"))
+    npts = int(header_lines[4].split(":")[1].strip())
+    components = header_lines[7].split(":")[1].split()
+    components = [c.strip() for c in components]
+    return {"station": station, "starttime": starttime, "sampling_rate": fs, "npts": npts, "components": components}
+
 def create_stream_from_txt(txt_file_path: Path) -> tuple:
     try:
         with open(txt_file_path, "r") as file:
             file_contents = file.readlines()
-            station = file_contents[1].strip().split(":")[1].strip()
-            starttime = UTCDateTime(file_contents[2].strip().split(":", 1)[1])
-            fs = float(file_contents[3].split(":")[1].strip(" HhZz\n"))
-            npts = int(file_contents[4].split(":")[1].strip())
-            components = file_contents[7].split(":")[1].split()
-            components = [c.strip() for c in components]
-            df = pd.DataFrame([row.strip().split() for row in file_contents[10:]])
-            df.columns = components
-
-            stats = {"npts": npts, "sampling_rate": fs, "station": station, "starttime": starttime}
-
-            traces = []
-            for c in components:
-                data = pd.to_numeric(df[c]).to_numpy()
-                header = stats
-                header["component"] = c
-                tr = Trace(data=data, header=header)
-                traces.append(tr)
-
-            st = Stream(traces=traces)
-
-            error = utilities.validate_stream(st)
-            
-            return st, error
+    except Exception as e:
+        return None, str(e)
+
+    return create_stream_from_txt_lines(file_contents)
+
+def create_stream_from_txt_lines(file_contents: list) -> tuple:
+    try:
+        txt_header = parse_txt_header(file_contents)
+        station = txt_header["station"]
+        starttime = txt_header["starttime"]
+        fs = txt_header["sampling_rate"]
+        npts = txt_header["npts"]
+        components = txt_header["components"]
+        df = pd.DataFrame([row.strip().split() for row in file_contents[10:]])
+        df.columns = components
+
+        stats = {"npts": npts, "sampling_rate": fs, "station": station, "starttime": starttime}
+
+        traces = []
+        for c in components:
+            data = pd.to_numeric(df[c]).to_numpy()
+            header = stats
+            header["component"] = c
+            tr = Trace(data=data, header=header)
+            traces.append(tr)
+
+        st = Stream(traces=traces)
+
+        error = utilities.validate_stream(st)
+        
+        return st, error
     except Exception as e:
         return None, str(e)
 
@@ -98,8 +118,39 @@ def pre_process_stream(stream: Stream) -> tuple:
         return stream, None
     except Exception as e:
         return None, str(e)
+
+def pre_process_stream_array(stream: Stream) -> tuple:
+    # same steps as pre_process_stream, applied to all the components at once
+    try:
+        data = array_processing.stream_to_array(stream)
+        fs = stream.traces[0].stats.sampling_rate
+        data = array_processing.filter_array(data, fs)
+        array_processing.array_to_stream(data, stream)
+        return stream, None
+    except Exception as e:
+        return None, str(e)
+
+def process_noise_signal_arrays(st_noise: Stream, st_signal: Stream) -> tuple:
+    # same steps as process_noise_signal_streams, applied to all the components at once
+    try:
+        for st in [st_noise, st_signal]:
+            data = array_processing.stream_to_array(st)
+            array_processing.taper_array(data, st.traces[0].stats.sampling_rate)
+            array_processing.array_to_stream(data, st)
+        return (st_noise, st_signal), None
+    except Exception as e:
+        return None, str(e)
     
 
+@lru_cache(maxsize=None)
+def get_konno_ohmachi_matrix(min_freq: float, max_freq: float, total_freqs: int, bandwidth: float) -> np.ndarray:
+    # the interpolation frequencies are fixed, so the smoothing windows are built once
+    # (each row is the normalized window of one center frequency, as in konno_ohmachi_smoothing)
+    fas_freqs_interp = np.logspace(np.log10(min_freq), np.log10(max_freq), num=total_freqs)
+    smoothing_matrix = calculate_smoothing_matrix(fas_freqs_interp, bandwidth, normalize=True)
+    smoothing_matrix.flags.writeable = False
+    return smoothing_matrix
+
 def compute_fourier(tr: Trace) -> dict:
     tr_stats = tr.stats
     sampling_rate = tr_stats.sampling_rate
@@ -121,12 +172,13 @@ def compute_fourier(tr: Trace) -> dict:
  # fas_amps_interp = np.interp(fas_freqs_interp, fas_freqs, fft_amp_abs)
     fas_amps_interp = np.power(10, np.interp(np.log10(fas_freqs_interp), np.log10(fas_freqs), np.log10(fft_amp_abs)))
     
-    fas_amps_konno = konno_ohmachi_smoothing(
-        fas_amps_interp, 
-        fas_freqs_interp, 
-        bandwidth=AppParameters.KONNO_OMACHI_BANDWIDTH.value, 
-        normalize=True
+    smoothing_matrix = get_konno_ohmachi_matrix(
+        AppParameters.FOURIER_MIN_FREQ.value, 
+        AppParameters.FOURIER_MAX_FREQ.value, 
+        AppParameters.FOURIER_TOTAL_FREQS.value, 
+        AppParameters.KONNO_OMACHI_BANDWIDTH.value
     )
+    fas_amps_konno = np.dot(smoothing_matrix, fas_amps_interp)
     
     return {
         "component": tr_stats.component,
@@ -148,24 +200,100 @@ def apply_signal_to_noise_ratio(noise_fas_amps: np.ndarray, signal_fas_amps: np.
 
     return signal_fas_amps_filtered
 
-def compute_response_spectra(trace: Trace) -> dict:
-    periods = np.linspace(
+def is_horizontal_component(component: str) -> bool:
+    return component.upper() not in ["Z", "3"]
+
+def get_response_spectra_periods() -> np.ndarray:
+    return np.linspace(
         AppParameters.RESPONSE_SPECTRA_MIN_PERIOD.value, 
         AppParameters.RESPONSE_SPECTRA_MAX_PERIOD.value, 
         AppParameters.RESPONSE_SPECTRA_TOTAL_PERIODS.value, 
     )
-    rs = NigamJennings(
+
+def create_response_spectrum(trace: Trace, periods: np.ndarray) -> NigamJennings:
+    return NigamJennings(
         trace.data, 
         1/trace.stats.sampling_rate, 
         periods, 
         damping=AppParameters.RESPONSE_SPECTRA_DUMPING.value, 
         units="m/s/s"
     )
-    spec, ts, acc, vel, dis = rs.evaluate()
-    return {
-        "displacement": dis,
-        "acceleration": acc, 
-        "velocity": vel,
-        "spec": spec,
-        "period": periods
+
+RESPONSE_SPECTRA_OUTPUTS = ["Pseudo-Velocity", "Pseudo-Acceleration"]
+
+def compute_response_spectra(trace: Trace) -> dict:
+    periods = get_response_spectra_periods()
+    rs = create_response_spectrum(trace, periods)
+    # only the pseudo spectra are used, the oscillator histories and the integrated
+    # time series are not computed
+    result = rs.evaluate_lazy(outputs=RESPONSE_SPECTRA_OUTPUTS)
+
+    # plain arrays, computed here by the compute worker and sent back to the writer
+    spec = {key: result.response_spectrum[key] for key in RESPONSE_SPECTRA_OUTPUTS}
+    return {"spec": {"Period": periods, **spec}, "period": periods}
+
+def compute_rotd_response_spectra(stream: Stream) -> tuple:
+    # also returns the response spectra of the two horizontal components ("horizontal_spectra",
+    # trace index -> compute_response_spectra like dict), they come from the same oscillator runs
+    horizontal_indexes = [i for i, tr in enumerate(stream.traces) if is_horizontal_component(tr.stats.component)]
+    if len(horizontal_indexes) != 2:
+        return None, f"Expected two horizontal components but found {len(horizontal_indexes)}!"
+
+    horizontal_traces = [stream.traces[i] for i in horizontal_indexes]
+    tr_1, tr_2 = horizontal_traces
+    if tr_1.stats.sampling_rate != tr_2.stats.sampling_rate or tr_1.stats.npts != tr_2.stats.npts:
+        return None, "The horizontal components must share the same sampling rate and number of samples!"
+
+    periods = get_response_spectra_periods()
+    angles = np.arange(0, 180, AppParameters.ROTD_ANGLE_STEP.value)
+    horizontal_spectra = {
+        i: {"spec": {"Period": periods, **{key: np.zeros(len(periods)) for key in RESPONSE_SPECTRA_OUTPUTS}}, "period": periods}
+        for i in horizontal_indexes
     }
+    rotated_displacement = np.zeros([len(angles), len(periods)])
+
+    # the oscillators run on chunks of periods, so only two [Time, Period chunk] displacement
+    # histories are held at once whatever the length of the record
+    chunk_size = max(1, AppParameters.ROTD_MAX_HISTORY_ELEMENTS.value // tr_1.stats.npts)
+
+    try:
+        for j in range(0, len(periods), chunk_size):
+            chunk_periods = periods[j:j + chunk_size]
+            results = []
+            for i, tr in zip(horizontal_indexes, horizontal_traces):
+                result = create_response_spectrum(tr, chunk_periods).evaluate_lazy(outputs=RESPONSE_SPECTRA_OUTPUTS)
+                # the same run gives the peaks and the displacement history
+                result.get_histories("Displacement")
+                for key in RESPONSE_SPECTRA_OUTPUTS:
+                    horizontal_spectra[i]["spec"][key][j:j + chunk_size] = result.response_spectrum[key]
+                results.append(result)
+
+            displacements = [result.get_histories("Displacement")[0] for result in results]
+            rotated_displacement[:, j:j + chunk_size] = get_rotated_peak_response(displacements[0], displacements[1], angles)
+
+            # the histories of the chunk are released before the next one is computed
+            displacements = None
+            for result in results:
+                result.clear_histories()
+    except Exception as e:
+        return None, str(e)
+
+    omega = (2. * np.pi) / periods
+    rotd50 = np.median(rotated_displacement, axis=0)
+    rotd100 = np.max(rotated_displacement, axis=0)
+
+    return {
+        "period": periods,
+        "angles": angles,
+        "horizontal_spectra": horizontal_spectra,
+        "RotD50": {
+            "Displacement": rotd50,
+            "Pseudo-Velocity": omega * rotd50,
+            "Pseudo-Acceleration": (omega ** 2.) * rotd50
+        },
+        "RotD100": {
+            "Displacement": rotd100,
+            "Pseudo-Velocity": omega * rotd100,
+            "Pseudo-Acceleration": (omega ** 2.) * rotd100
+        }
+    }, None
@@ -0,0 +1,244 @@
+from pathlib import Path
+import argparse
+import multiprocessing
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import pipeline
+from config import *
+
+# SQLite job queue: any number of worker processes claim records with a lease, heartbeat
+# while computing and mark them done or failed. Expired leases are claimed again, so a
+# crash loses no work. The BEGIN IMMEDIATE locking is not reliable on network filesystems
+# (NFS/SMB), keep the queue file on a local disk and use directory_queue.py for workers
+# on several machines.
+CREATE_TABLE_QUERY = """
+CREATE TABLE IF NOT EXISTS jobs (
+    path TEXT PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    error TEXT,
+    result_path TEXT,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+)
+"""
+
+def connect_queue(queue_file_path: Path = AppRoutes.QUEUE_FILE_PATH.value) -> sqlite3.Connection:
+    # autocommit mode, the transactions are opened explicitly with BEGIN IMMEDIATE
+    connection = sqlite3.connect(queue_file_path, timeout=30, isolation_level=None)
+    connection.row_factory = sqlite3.Row
+    connection.execute(CREATE_TABLE_QUERY)
+    connection.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_expires)")
+    return connection
+
+def get_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}"
+
+def enqueue_records(seismic_files: list, queue_file_path: Path = AppRoutes.QUEUE_FILE_PATH.value) -> int:
+    # records already in the queue keep their status, so enqueueing again is safe
+    connection = connect_queue(queue_file_path)
+    now = time.time()
+    connection.execute("BEGIN IMMEDIATE")
+    total_before = connection.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+    connection.executemany(
+        "INSERT OR IGNORE INTO jobs (path, enqueued_at) VALUES (?, ?)",
+        [(str(Path(seismic_file).resolve()), now) for seismic_file in seismic_files]
+    )
+    total_after = connection.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+    connection.execute("COMMIT")
+    connection.close()
+    return total_after - total_before
+
+def claim_job(connection: sqlite3.Connection, worker_id: str, lease_seconds: float = AppParameters.QUEUE_LEASE_SECONDS.value, max_attempts: int = AppParameters.QUEUE_MAX_ATTEMPTS.value) -> str | None:
+    now = time.time()
+    connection.execute("BEGIN IMMEDIATE")
+    # jobs whose worker died on the last attempt will not be claimed again
+    connection.execute(
+        """
+        UPDATE jobs SET status = 'failed', error = 'The lease expired before the job was completed', lease_expires = NULL
+        WHERE status = 'running' AND lease_expires < ? AND attempts >= ?
+        """,
+        (now, max_attempts)
+    )
+    row = connection.execute(
+        """
+        SELECT path FROM jobs
+        WHERE (status = 'pending' OR (status = 'running' AND lease_expires < ?))
+        AND attempts < ?
+        ORDER BY attempts, enqueued_at, path
+        LIMIT 1
+        """,
+        (now, max_attempts)
+    ).fetchone()
+
+    if row is None:
+        connection.execute("COMMIT")
+        return None
+
+    connection.execute(
+        """
+        UPDATE jobs SET status = 'running', worker = ?, lease_expires = ?, attempts = attempts + 1, started_at = ?
+        WHERE path = ?
+        """,
+        (worker_id, now + lease_seconds, now, row["path"])
+    )
+    connection.execute("COMMIT")
+    return row["path"]
+
+def heartbeat_job(connection: sqlite3.Connection, path: str, worker_id: str, lease_seconds: float = AppParameters.QUEUE_LEASE_SECONDS.value) -> bool:
+    # returns False when the lease has been lost (expired and claimed by another worker)
+    cursor = connection.execute(
+        "UPDATE jobs SET lease_expires = ? WHERE path = ? AND worker = ? AND status = 'running'",
+        (time.time() + lease_seconds, path, worker_id)
+    )
+    return cursor.rowcount == 1
+
+def complete_job(connection: sqlite3.Connection, path: str, worker_id: str, result_path: str) -> bool:
+    cursor = connection.execute(
+        """
+        UPDATE jobs SET status = 'done', result_path = ?, error = NULL, finished_at = ?, lease_expires = NULL
+        WHERE path = ? AND worker = ? AND status = 'running'
+        """,
+        (result_path, time.time(), path, worker_id)
+    )
+    return cursor.rowcount == 1
+
+def fail_job(connection: sqlite3.Connection, path: str, worker_id: str, error: str, max_attempts: int = AppParameters.QUEUE_MAX_ATTEMPTS.value) -> bool:
+    # the job goes back to pending until it runs out of attempts
+    cursor = connection.execute(
+        """
+        UPDATE jobs SET status = CASE WHEN attempts < ? THEN 'pending' ELSE 'failed' END,
+        error = ?, finished_at = ?, lease_expires = NULL
+        WHERE path = ? AND worker = ? AND status = 'running'
+        """,
+        (max_attempts, error, time.time(), path, worker_id)
+    )
+    return cursor.rowcount == 1
+
+def _heartbeat_loop(queue_file_path: Path, path: str, worker_id: str, lease_seconds: float, stop_event: threading.Event) -> None:
+    connection = connect_queue(queue_file_path)
+    while not stop_event.wait(lease_seconds / 3):
+        if not heartbeat_job(connection, path, worker_id, lease_seconds):
+            break
+    connection.close()
+
+def process_job(path: str, results_folder_path: Path) -> tuple:
+    stream, error = pipeline.read_record(Path(path))
+    if error is not None:
+        return None, error
+
+    result, error = pipeline.compute_record(stream)
+    if error is not None:
+        return None, error
+
+    return pipeline.save_record_results(result, results_folder_path)
+
+def run_worker(queue_file_path: Path = AppRoutes.QUEUE_FILE_PATH.value, results_folder_path: Path = AppRoutes.RESULTS_FOLDER_PATH.value, lease_seconds: float = AppParameters.QUEUE_LEASE_SECONDS.value, max_attempts: int = AppParameters.QUEUE_MAX_ATTEMPTS.value, worker_id: str | None = None) -> int:
+    # claims jobs until the queue has nothing left to run, returns the number of completed jobs
+    worker_id = worker_id or get_worker_id()
+    connection = connect_queue(queue_file_path)
+    total_done = 0
+
+    while True:
+        path = claim_job(connection, worker_id, lease_seconds, max_attempts)
+        if path is None:
+            break
+
+        handle_info(f"{worker_id} processing: {path}...")
+        stop_event = threading.Event()
+        heartbeat = threading.Thread(target=_heartbeat_loop, args=(queue_file_path, path, worker_id, lease_seconds, stop_event), daemon=True)
+        heartbeat.start()
+
+        try:
+            result_path, error = process_job(path, results_folder_path)
+        except Exception as e:
+            result_path, error = None, str(e)
+        finally:
+            stop_event.set()
+            heartbeat.join()
+
+        if error is not None:
+            handle_error(f"Cannot process '{path}': {error}")
+            fail_job(connection, path, worker_id, error, max_attempts)
+        elif complete_job(connection, path, worker_id, str(result_path)):
+            total_done += 1
+        else:
+            handle_error(f"The lease of '{path}' was lost, the result of {worker_id} is discarded")
+
+    connection.close()
+    return total_done
+
+def run_local_workers(total_workers: int, queue_path: Path = AppRoutes.QUEUE_FILE_PATH.value, results_folder_path: Path = AppRoutes.RESULTS_FOLDER_PATH.value, worker=run_worker) -> None:
+    # several worker processes on this machine, they coordinate only through the queue
+    processes = [
+        multiprocessing.Process(target=worker, args=(queue_path, results_folder_path))
+        for _ in range(total_workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+def get_queue_stats(queue_file_path: Path = AppRoutes.QUEUE_FILE_PATH.value, window_seconds: float = 60) -> dict:
+    # safe to call from any process while the workers are running
+    connection = connect_queue(queue_file_path)
+    now = time.time()
+
+    counts = {"pending": 0, "running": 0, "done": 0, "failed": 0}
+    for row in connection.execute("SELECT status, COUNT(*) AS total FROM jobs GROUP BY status"):
+        counts[row["status"]] = row["total"]
+
+    recent = connection.execute(
+        "SELECT COUNT(*) AS total, AVG(finished_at - started_at) AS duration FROM jobs WHERE status = 'done' AND finished_at >= ?",
+        (now - window_seconds,)
+    ).fetchone()
+    errors = [
+        dict(row) for row in connection.execute(
+            "SELECT path, status, attempts, error FROM jobs WHERE error IS NOT NULL AND status != 'done' ORDER BY path"
+        )
+    ]
+    connection.close()
+
+    throughput = recent["total"] / window_seconds
+    remaining = counts["pending"] + counts["running"]
+    return {
+        **counts,
+        "total": sum(counts.values()),
+        "throughput_per_minute": throughput * 60,
+        "mean_job_seconds": recent["duration"],
+        "eta_seconds": remaining / throughput if throughput > 0 else None,
+        "errors": errors
+    }
+
+if __name__ == "__main__":
+    import directory_queue
+
+    parser = argparse.ArgumentParser(description="Resumable job queue for processing the data folder")
+    parser.add_argument("command", choices=["enqueue", "work", "stats"])
+    parser.add_argument("--backend", choices=["sqlite", "directory"], default="sqlite", help="sqlite: workers on this machine, directory: workers on any machine sharing the queue folder")
+    parser.add_argument("--queue", type=Path, default=None)
+    parser.add_argument("--results", type=Path, default=AppRoutes.RESULTS_FOLDER_PATH.value)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    setup_environment()
+
+    backend = directory_queue if args.backend == "directory" else sys.modules[__name__]
+    queue_path = args.queue
+    if queue_path is None:
+        queue_path = AppRoutes.QUEUE_FOLDER_PATH.value if args.backend == "directory" else AppRoutes.QUEUE_FILE_PATH.value
+
+    if args.command == "enqueue":
+        total_added = backend.enqueue_records(sorted(AppRoutes.DATA_FOLDER_PATH.value.iterdir()), queue_path)
+        handle_info(f"Enqueued {total_added} new records")
+    elif args.command == "work":
+        run_local_workers(args.workers, queue_path, args.results, backend.run_worker)
+    else:
+        print(backend.get_queue_stats(queue_path))
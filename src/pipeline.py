@@ -0,0 +1,234 @@
+from pathlib import Path
+import os
+from concurrent.futures import ProcessPoolExecutor
+from queue import Queue
+import threading
+import numpy as np
+from obspy import read as read_mseed
+import array_processing
+import functions
+import utilities
+from config import *
+
+# reader thread -> compute processes -> writer, the records in flight are bounded.
+# The writer is the only one touching matplotlib and the PDF.
+_STOP = object()
+
+def read_record(seismic_file: Path) -> tuple:
+    if seismic_file.suffix.lower() == ".txt":
+        stream, error = functions.create_stream_from_txt(seismic_file)
+        if error is not None:
+            return None, f"Cannot convert txt file '{seismic_file}' to mseed: {error}"
+        return stream, None
+
+    try:
+        stream = read_mseed(str(seismic_file))
+    except Exception as e:
+        return None, f"Cannot read the mseed file '{seismic_file}': {str(e)}"
+
+    error = utilities.validate_stream(stream)
+    if error is not None:
+        return None, error
+
+    return stream, None
+
+def compute_record(stream, ps_arrivals: dict | None = None, compute_rotd: bool = AppParameters.COMPUTE_ROTD.value) -> tuple:
+    # the same steps as the sequential loop of core.py, without the plotting.
+    # On an error the stages computed so far are returned together with it.
+    result = {
+        "initial_stream": stream.copy(),
+        "stream": None,
+        "Parr": None,
+        "Sarr": None,
+        "st_noise": None,
+        "st_signal": None,
+        "spectra": [],
+        "rotd": None,
+        "rotd_error": None
+    }
+
+    # components of unequal length (common in MiniSEED) go through the ObsPy steps
+    if array_processing.can_stack_stream(stream):
+        stream, error = functions.pre_process_stream_array(stream)
+    else:
+        stream, error = functions.pre_process_stream(stream)
+    if error is not None:
+        return result, f"Cannot preprocess the stream: {error}"
+
+    result["stream"] = stream
+
+    if ps_arrivals is None:
+        ps_arrivals, error = functions.get_record_arrivals(stream)
+        if error is not None:
+            return result, f"Cannot generate record P & S arrivals: {error}"
+    else:
+        # arrivals given by the caller are only validated
+        error = utilities.validate_arrivals(stream, ps_arrivals)
+        if error is not None:
+            return result, f"Invalid arrivals: {error}"
+
+    Parr = ps_arrivals["Parr"]
+    Sarr = ps_arrivals["Sarr"]
+    result["Parr"] = Parr
+    result["Sarr"] = Sarr
+
+    ps_windows, error = functions.generate_noise_signal_windows(stream, Parr, Sarr)
+    if error is not None:
+        return result, f"Cannot create the noise or the signal window: {error}"
+
+    st_noise, st_signal = ps_windows
+
+    if array_processing.can_stack_stream(st_noise) and array_processing.can_stack_stream(st_signal):
+        processed_ps_windows, error = functions.process_noise_signal_arrays(st_noise, st_signal)
+    else:
+        processed_ps_windows, error = functions.process_noise_signal_streams(st_noise, st_signal)
+    if error is not None:
+        return result, f"Cannot apply preprocessing steps to the noise and signal windows: {error}"
+
+    st_noise, st_signal = processed_ps_windows
+    result["st_noise"] = st_noise
+    result["st_signal"] = st_signal
+
+    # the response spectra of the horizontal components come from the RotD oscillator runs
+    horizontal_spectra = {}
+    if compute_rotd:
+        result["rotd"], result["rotd_error"] = functions.compute_rotd_response_spectra(stream)
+        if result["rotd"] is not None:
+            horizontal_spectra = result["rotd"]["horizontal_spectra"]
+
+    for i in range(len(stream)): # loop at each trace
+        tr_noise = st_noise.traces[i]
+        tr_signal = st_signal.traces[i]
+
+        tr_noise_dict = functions.compute_fourier(tr_noise)
+        tr_signal_dict = functions.compute_fourier(tr_signal)
+
+        tr_signal_dict["fas_amps_snr"] = functions.apply_signal_to_noise_ratio(
+            tr_noise_dict["fas_amps_konno"], tr_signal_dict["fas_amps_konno"]
+        )
+
+        if i in horizontal_spectra:
+            response_dict = horizontal_spectra[i]
+        else:
+            response_dict = functions.compute_response_spectra(stream.traces[i])
+
+        result["spectra"].append((tr_noise_dict, tr_signal_dict, response_dict, tr_noise.stats.channel))
+
+    return result, None
+
+def write_record(result: dict) -> None:
+    # plots every stage that has been computed, a failed record stops where its error occurred
+    stream = result["stream"]
+    Parr = result["Parr"]
+    Sarr = result["Sarr"]
+
+    utilities.plot_stream(result["initial_stream"],  title=f"Initial records")
+    if stream is None:
+        return
+
+    utilities.plot_stream(stream,  title=f"Filtered records ({str(AppParameters.FILTER_FREQ_MIN.value).replace('.', ',')}-{str(AppParameters.FILTER_FREQ_MAX.value).replace('.', ',')} Hz)")
+    if Parr is None or Sarr is None:
+        return
+
+    utilities.plot_stream(stream,  title=f"Arrivals Selection Parr={str(Parr).replace('.', ',')} & Sarr={str(Sarr).replace('.', ',')}", parr=Parr, sarr=Sarr)
+    if result["st_noise"] is None or result["st_signal"] is None:
+        return
+
+    utilities.plot_stream(result["st_noise"],  title=f"Trimmed noise window")
+    utilities.plot_stream(result["st_signal"],  title=f"Trimmed signal window")
+
+    for tr_noise_dict, tr_signal_dict, response_dict, channel in result["spectra"]:
+        utilities.plot_FAS_response_spectra(tr_noise_dict, tr_signal_dict, response_dict, channel)
+
+    if result["rotd_error"] is not None:
+        handle_error(f"Cannot compute the RotD50 & RotD100 response spectra: {result['rotd_error']}")
+    elif result["rotd"] is not None:
+        utilities.plot_rotd_response_spectra(result["rotd"], utilities.get_record_name(stream))
+
+def get_record_result_arrays(result: dict) -> dict:
+    # flat name -> array mapping of the spectra of every component
+    arrays = {"Parr": np.array(result["Parr"]), "Sarr": np.array(result["Sarr"])}
+    for tr_noise_dict, tr_signal_dict, response_dict, channel in result["spectra"]:
+        component = tr_signal_dict["component"]
+        for key in ["fas_freqs", "fas_amps", "fas_freqs_interp", "fas_amps_interp", "fas_amps_konno"]:
+            arrays[f"{component}_noise_{key}"] = tr_noise_dict[key]
+            arrays[f"{component}_signal_{key}"] = tr_signal_dict[key]
+        arrays[f"{component}_signal_fas_amps_snr"] = tr_signal_dict["fas_amps_snr"]
+        arrays[f"{component}_period"] = response_dict["spec"]["Period"]
+        arrays[f"{component}_pseudo_velocity"] = response_dict["spec"]["Pseudo-Velocity"]
+        arrays[f"{component}_pseudo_acceleration"] = response_dict["spec"]["Pseudo-Acceleration"]
+
+    if result["rotd"] is not None:
+        arrays["rotd_period"] = result["rotd"]["period"]
+        for rotd_type in ["RotD50", "RotD100"]:
+            arrays[f"{rotd_type}_pseudo_velocity"] = result["rotd"][rotd_type]["Pseudo-Velocity"]
+            arrays[f"{rotd_type}_pseudo_acceleration"] = result["rotd"][rotd_type]["Pseudo-Acceleration"]
+
+    return arrays
+
+def save_record_results(result: dict, results_folder_path: Path) -> tuple:
+    # one .npz per record with the spectra of every component
+    try:
+        results_folder_path = Path(results_folder_path)
+        results_folder_path.mkdir(parents=True, exist_ok=True)
+        record_name = utilities.get_record_name(result["stream"])
+        arrays = get_record_result_arrays(result)
+
+        # written next to the final file and renamed, so a crash never leaves a partial result
+        result_path = results_folder_path / f"{record_name}.npz"
+        temporary_path = results_folder_path / f".{record_name}.{os.getpid()}.{threading.get_ident()}.npz"
+        with open(temporary_path, "wb") as file:
+            np.savez(file, **arrays)
+        os.replace(temporary_path, result_path)
+
+        return result_path, None
+    except Exception as e:
+        return None, str(e)
+
+def _reader(seismic_files: list, executor: ProcessPoolExecutor, write_queue: Queue, in_flight: threading.Semaphore) -> None:
+    for seismic_file in seismic_files:
+        # wait until the writer has released a record before loading a new one
+        in_flight.acquire()
+        handle_info(f"processing: {seismic_file}...")
+        stream, error = read_record(seismic_file)
+        future = executor.submit(compute_record, stream) if error is None else None
+        write_queue.put((seismic_file, future, error))
+
+    write_queue.put(_STOP)
+
+def run_pipeline(seismic_files: list, compute_workers: int = AppParameters.PIPELINE_COMPUTE_WORKERS.value, max_records_in_flight: int = AppParameters.PIPELINE_MAX_RECORDS_IN_FLIGHT.value) -> None:
+    seismic_files = list(seismic_files)
+    compute_workers = max(1, compute_workers)
+    max_records_in_flight = max(1, max_records_in_flight)
+
+    # at most max_records_in_flight records are held in memory by all the stages together
+    in_flight = threading.Semaphore(max_records_in_flight)
+    write_queue = Queue(maxsize=max_records_in_flight)
+
+    # the oscillators are pure Python loops holding the GIL, so the records are computed
+    # in worker processes while the reader and the writer stay threads of this process
+    with ProcessPoolExecutor(max_workers=compute_workers) as executor:
+        reader = threading.Thread(target=_reader, args=(seismic_files, executor, write_queue, in_flight), daemon=True)
+        reader.start()
+
+        # the writer runs on the calling thread and keeps the input order of the files in the PDF
+        while True:
+            item = write_queue.get()
+            if item is _STOP:
+                break
+
+            seismic_file, future, error = item
+            result = None
+            if future is not None:
+                try:
+                    result, error = future.result()
+                except Exception as e:
+                    error = str(e)
+
+            if result is not None:
+                write_record(result)
+            if error is not None:
+                handle_error(error)
+            in_flight.release()
+
+        reader.join()
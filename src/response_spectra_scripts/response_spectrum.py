@@ -6,23 +6,140 @@ the Newmark-Beta method
 '''
 
 import numpy as np
+from abc import ABC, abstractmethod
+from collections.abc import Mapping
 from math import sqrt
 from scipy.integrate import cumulative_trapezoid
 import matplotlib.pyplot as plt
 from response_spectra_scripts.sm_utils import (_save_image,
                       get_time_vector,
                       convert_accel_units,
+                      get_accel_unit_factor,
                       get_velocity_displacement)
                      
 
-class ResponseSpectrum(object):
+SPECTRUM_PEAKS = {'Acceleration': 'Acceleration',
+                  'Velocity': 'Velocity',
+                  'Displacement': 'Displacement',
+                  'Pseudo-Velocity': 'Displacement',
+                  'Pseudo-Acceleration': 'Displacement'}
+
+
+class LazyDict(Mapping):
+    '''
+    Read-only dictionary whose values are computed on first access and
+    then cached
     '''
-    Base Class to implement a response spectrum calculation
+    def __init__(self, loaders):
+        '''
+        :param dict loaders:
+            Key - function without arguments returning the value of the key
+        '''
+        self._loaders = loaders
+        self._values = {}
+
+    def __getitem__(self, key):
+        if key not in self._values:
+            self._values[key] = self._loaders[key]()
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._loaders)
+
+    def __len__(self):
+        return len(self._loaders)
+
+
+class ResponseSpectrumResult(object):
+    '''
+    Lazy results of a response spectrum calculation. The spectra, the time
+    series and the peak values are computed on first access and cached. The
+    oscillators are run once for all the declared outputs and without
+    keeping their time histories, unless these are requested
+    '''
+    def __init__(self, calculator, outputs=None):
+        '''
+        :param calculator:
+            Instance of a ResponseSpectrum subclass
+        :param list outputs:
+            Response spectrum keys needed by the caller (e.g.
+            ['Pseudo-Velocity']), all of them if None
+        '''
+        if outputs is None:
+            outputs = list(SPECTRUM_PEAKS)
+        unknown_outputs = set(outputs) - set(SPECTRUM_PEAKS)
+        if unknown_outputs:
+            raise ValueError("Unrecognised response spectrum outputs %s. "
+                             "Should be in %s" % (sorted(unknown_outputs),
+                                                  list(SPECTRUM_PEAKS)))
+        self.calculator = calculator
+        self.peaks_needed = set(SPECTRUM_PEAKS[key] for key in outputs)
+        self._peaks = {}
+        self._histories = {}
+        omega = calculator.omega
+        self.response_spectrum = LazyDict({
+            'Period': lambda: calculator.periods,
+            'Acceleration': lambda: self.get_peak('Acceleration'),
+            'Velocity': lambda: self.get_peak('Velocity'),
+            'Displacement': lambda: self.get_peak('Displacement'),
+            'Pseudo-Velocity': lambda: omega * self.get_peak('Displacement'),
+            'Pseudo-Acceleration': lambda: (omega ** 2.) *
+                self.get_peak('Displacement')})
+        self.time_series = LazyDict({
+            'Time-Step': lambda: calculator.d_t,
+            'Acceleration': lambda: calculator.acceleration,
+            'Velocity': lambda: calculator.velocity,
+            'Displacement': lambda: calculator.displacement,
+            'PGA': lambda: np.max(np.fabs(calculator.acceleration)),
+            'PGV': lambda: np.max(np.fabs(calculator.velocity)),
+            'PGD': lambda: np.max(np.fabs(calculator.displacement))})
+
+    def get_peak(self, key):
+        '''
+        Returns the peak absolute oscillator response for each period
+        :param str key:
+            'Acceleration', 'Velocity' or 'Displacement'
+        '''
+        if key not in self._peaks:
+            peaks = (self.peaks_needed | set([key])) - set(self._peaks)
+            self._peaks.update(
+                self.calculator._get_oscillator_response(peaks, [])[0])
+        return self._peaks[key]
+
+    def get_histories(self, *keys):
+        '''
+        Returns the time histories of the oscillators [Time, Period]
+        :param str keys:
+            'Acceleration', 'Velocity' and/or 'Displacement'
+        '''
+        missing = [key for key in keys if key not in self._histories]
+        if missing:
+            # the declared peaks come at no extra cost in the same run
+            peaks = self.peaks_needed - set(self._peaks)
+            new_peaks, new_histories = \
+                self.calculator._get_oscillator_response(peaks, missing)
+            self._peaks.update(new_peaks)
+            self._histories.update(new_histories)
+        return tuple(self._histories[key] for key in keys)
+
+    def clear_histories(self):
+        '''
+        Releases the cached time histories of the oscillators, the peaks are
+        kept
+        '''
+        self._histories = {}
+
+
+class ResponseSpectrum(ABC):
+    '''
+    Base Class to implement a response spectrum calculation, the subclasses
+    define how the oscillators are run
     '''
     def __init__(self, acceleration, time_step, periods, damping=0.05,
             units="cm/s/s"):
         '''
-        Setup the response spectrum calculator
+        Setup the response spectrum calculator. The unit conversion and the
+        velocity and displacement time series are computed on first use
         :param numpy.ndarray time_hist:
             Acceleration time history [Time, Acceleration]
         :param numpy.ndarray periods:
@@ -34,15 +151,58 @@ class ResponseSpectrum(object):
         '''
         self.periods = periods
         self.num_per = len(periods)
-        self.acceleration = convert_accel_units(acceleration, units)
+        self.units = units
+        self.accel_factor = get_accel_unit_factor(units)
+        self.raw_acceleration = np.asarray(acceleration)
         self.damping = damping
         self.d_t = time_step
-        self.velocity, self.displacement = get_velocity_displacement(
-            self.d_t, self.acceleration)
-        self.num_steps = len(self.acceleration)
+        self.num_steps = len(acceleration)
         self.omega = (2. * np.pi) / self.periods
         self.response_spectrum = None
+        self._acceleration = None
+        self._velocity = None
+        self._displacement = None
+
+    @property
+    def acceleration(self):
+        '''
+        Acceleration time series (cm/s/s)
+        '''
+        if self._acceleration is None:
+            self._acceleration = convert_accel_units(self.raw_acceleration,
+                                                     self.units)
+        return self._acceleration
 
+    @property
+    def velocity(self):
+        '''
+        Velocity time series (cm/s)
+        '''
+        if self._velocity is None:
+            self._velocity, self._displacement = get_velocity_displacement(
+                self.d_t, self.acceleration)
+        return self._velocity
+
+    @property
+    def displacement(self):
+        '''
+        Displacement time series (cm)
+        '''
+        if self._displacement is None:
+            self._velocity, self._displacement = get_velocity_displacement(
+                self.d_t, self.acceleration)
+        return self._displacement
+
+    def evaluate_lazy(self, outputs=None):
+        '''
+        Returns the response spectrum results without computing them
+        :param list outputs:
+            Response spectrum keys needed by the caller (e.g.
+            ['Pseudo-Velocity']), all of them if None
+        :returns:
+            ResponseSpectrumResult
+        '''
+        return ResponseSpectrumResult(self, outputs)
 
     def evaluate(self):
         '''
@@ -70,6 +230,26 @@ class ResponseSpectrum(object):
             vel - Velocity response of Single Degree of Freedom Oscillator 
             disp - Displacement response of Single Degree of Freedom Oscillator 
         '''
+        result = self.evaluate_lazy()
+        accel, vel, disp = result.get_histories('Acceleration', 'Velocity',
+                                                'Displacement')
+        self.response_spectrum = dict(result.response_spectrum)
+        time_series = dict(result.time_series)
+        return self.response_spectrum, time_series, accel, vel, disp
+
+    @abstractmethod
+    def _get_oscillator_response(self, peaks, histories):
+        '''
+        Runs the oscillators
+        :param set peaks:
+            Peak responses to return ('Acceleration', 'Velocity',
+            'Displacement')
+        :param list histories:
+            Response time histories to return
+        :returns:
+            peaks - Dictionary of peak absolute responses for each period
+            histories - Dictionary of response time histories [Time, Period]
+        '''
 
 
 
@@ -78,56 +258,30 @@ class NewmarkBeta(ResponseSpectrum):
     Evaluates the response spectrum using the Newmark-Beta methodology
     '''
 
-    def evaluate(self):
+    def _get_oscillator_response(self, peaks, histories):
         '''
-        Evaluates the response spectrum
+        Runs the Newmark-Beta integration, the peak acceleration is taken
+        from the absolute acceleration response
+        :param set peaks:
+            Peak responses to return ('Acceleration', 'Velocity',
+            'Displacement')
+        :param list histories:
+            Response time histories to return
         :returns:
-            Response Spectrum - Dictionary containing all response spectrum
-                                data
-                'Time' - Time (s)
-                'Acceleration' - Acceleration Response Spectrum (cm/s/s)
-                'Velocity' - Velocity Response Spectrum (cm/s)
-                'Displacement' - Displacement Response Spectrum (cm)
-                'Pseudo-Velocity' - Pseudo-Velocity Response Spectrum (cm/s)
-                'Pseudo-Acceleration' - Pseudo-Acceleration Response Spectrum 
-                                       (cm/s/s)
-            Time Series - Dictionary containing all time-series data
-                'Time' - Time (s)
-                'Acceleration' - Acceleration time series (cm/s/s)
-                'Velocity' - Velocity time series (cm/s)
-                'Displacement' - Displacement time series (cm)
-                'PGA' - Peak ground acceleration (cm/s/s)
-                'PGV' - Peak ground velocity (cm/s)
-                'PGD' - Peak ground displacement (cm)
-                
-            accel - Acceleration response of Single Degree of Freedom Oscillator 
-            vel - Velocity response of Single Degree of Freedom Oscillator 
-            disp - Displacement response of Single Degree of Freedom Oscillator 
+            peaks - Dictionary of peak absolute responses for each period
+            histories - Dictionary of response time histories [Time, Period]
         '''
         omega = (2. * np.pi) / self.periods
         cval = self.damping * 2. * omega
         kval = ((2. * np.pi) / self.periods) ** 2.
         # Perform Newmark - Beta integration
         accel, vel, disp, a_t = self._newmark_beta(omega, cval, kval)
-        self.response_spectrum = {
-            'Period': self.periods,
-            'Acceleration': np.max(np.fabs(a_t), axis=0),
-            'Velocity': np.max(np.fabs(vel), axis=0),
-            'Displacement': np.max(np.fabs(disp), axis=0)}
-        self.response_spectrum['Pseudo-Velocity'] =  omega * \
-            self.response_spectrum['Displacement']
-        self.response_spectrum['Pseudo-Acceleration'] =  (omega ** 2.) * \
-            self.response_spectrum['Displacement']
-        time_series = {
-            'Time-Step': self.d_t,
-            'Acceleration': self.acceleration,
-            'Velocity': self.velocity,
-            'Displacement': self.displacement,
-            'PGA': np.max(np.fabs(self.acceleration)),
-            'PGV': np.max(np.fabs(self.velocity)),
-            'PGD': np.max(np.fabs(self.displacement))}
-        return self.response_spectrum, time_series, accel, vel, disp
-        
+        response = {'Acceleration': a_t, 'Velocity': vel,
+                    'Displacement': disp}
+        peak_values = dict([(key, np.max(np.fabs(response[key]), axis=0))
+                            for key in peaks])
+        response['Acceleration'] = accel
+        return peak_values, dict([(key, response[key]) for key in histories])
 
     def _newmark_beta(self, omega, cval, kval):
         '''
@@ -174,9 +328,17 @@ class NigamJennings(ResponseSpectrum):
     of the sampling frequency.
     """
 
-    def evaluate(self):
+    def _get_oscillator_response(self, peaks, histories):
         """
-        Define the response spectrum
+        Defines the constants of the algorithm and runs the oscillators
+        :param set peaks:
+            Peak responses to return ('Acceleration', 'Velocity',
+            'Displacement')
+        :param list histories:
+            Response time histories to return
+        :returns:
+            peaks - Dictionary of peak absolute responses for each period
+            histories - Dictionary of response time histories [Time, Period]
         """
         omega = (2. * np.pi) / self.periods
         omega2 = omega ** 2.
@@ -195,65 +357,80 @@ class NigamJennings(ResponseSpectrum):
         const['g2'] = const['e'] * const['c']
         const['h1'] = (omega_d * const['g2']) - (const['f3'] * const['g1'])
         const['h2'] = (omega_d * const['g1']) + (const['f3'] * const['g2'])
-        x_a, x_v, x_d = self._get_time_series(const, omega2)
-
-        self.response_spectrum = {
-            'Period': self.periods,
-            'Acceleration': np.max(np.fabs(x_a), axis=0),
-            'Velocity': np.max(np.fabs(x_v), axis=0),
-            'Displacement': np.max(np.fabs(x_d), axis=0)}
-        self.response_spectrum['Pseudo-Velocity'] =  omega * \
-            self.response_spectrum['Displacement']
-        self.response_spectrum['Pseudo-Acceleration'] =  (omega ** 2.) * \
-            self.response_spectrum['Displacement']
-        time_series = {
-            'Time-Step': self.d_t,
-            'Acceleration': self.acceleration,
-            'Velocity': self.velocity,
-            'Displacement': self.displacement,
-            'PGA': np.max(np.fabs(self.acceleration)),
-            'PGV': np.max(np.fabs(self.velocity)),
-            'PGD': np.max(np.fabs(self.displacement))}
-
-        return self.response_spectrum, time_series, x_a, x_v, x_d
-        
-    def _get_time_series(self, const, omega2):
+        return self._get_response(const, omega2, peaks, histories)
+
+    def _get_response(self, const, omega2, peaks, histories):
         """
-        Calculates the acceleration, velocity and displacement time series for
-        the SDOF oscillator
+        Runs the SDOF oscillators. Only the requested time histories are
+        stored, the other peaks are tracked step by step. As the oscillator
+        is linear it runs on the acceleration in its original units and the
+        responses are scaled to cm/s/s afterwards
         :param dict const:
             Constants of the algorithm
         :param np.ndarray omega2:
             Square of the oscillator period
+        :param set peaks:
+            Peak responses to return ('Acceleration', 'Velocity',
+            'Displacement')
+        :param list histories:
+            Response time histories to return
         :returns:
-            x_a = Acceleration time series
-            x_v = Velocity time series
-            x_d = Displacement time series
+            peaks - Dictionary of peak absolute responses for each period
+            histories - Dictionary of response time histories [Time, Period]
         """
-        x_d = np.zeros([self.num_steps - 1, self.num_per], dtype=float)
-        x_v = np.zeros_like(x_d)
-        x_a = np.zeros_like(x_d)
-        
+        acceleration = self.raw_acceleration
+        stored = dict([(key, np.zeros([self.num_steps - 1, self.num_per],
+                                      dtype=float)) for key in histories])
+        tracked = dict([(key, np.zeros(self.num_per, dtype=float))
+                        for key in peaks if key not in stored])
+        x_a_hist = stored.get('Acceleration')
+        x_v_hist = stored.get('Velocity')
+        x_d_hist = stored.get('Displacement')
+        x_a_peak = tracked.get('Acceleration')
+        x_v_peak = tracked.get('Velocity')
+        x_d_peak = tracked.get('Displacement')
+        need_accel = (x_a_hist is not None) or (x_a_peak is not None)
+        # Response of the previous step (at rest before the first one)
+        x_d = np.zeros(self.num_per, dtype=float)
+        x_v = np.zeros(self.num_per, dtype=float)
+
         for k in range(0, self.num_steps - 1):
-            yval = k - 1
-            dug = self.acceleration[k + 1] - self.acceleration[k]
+            dug = acceleration[k + 1] - acceleration[k]
             z_1 = const['f2'] * dug
-            z_2 = const['f2'] * self.acceleration[k]
+            z_2 = const['f2'] * acceleration[k]
             z_3 = const['f1'] * dug
             z_4 = z_1 / self.d_t
-            if k == 0:
-                b_val = z_2 - z_3
-                a_val = (const['f5'] * b_val) + (const['f4'] * z_4)
-            else:    
-                b_val = x_d[k - 1, :] + z_2 - z_3
-                a_val = (const['f4'] * x_v[k - 1, :]) +\
-                    (const['f5'] * b_val) + (const['f4'] * z_4)
-
-            x_d[k, :] = (a_val * const['g1']) + (b_val * const['g2']) +\
+            b_val = x_d + z_2 - z_3
+            a_val = (const['f4'] * x_v) +\
+                (const['f5'] * b_val) + (const['f4'] * z_4)
+
+            x_d = (a_val * const['g1']) + (b_val * const['g2']) +\
                 z_3 - z_2 - z_1
-            x_v[k, :] = (a_val * const['h1']) - (b_val * const['h2']) - z_4
-            x_a[k, :] = (-const['f6'] * x_v[k, :]) - (omega2 * x_d[k, :])
-        return x_a, x_v, x_d
+            x_v = (a_val * const['h1']) - (b_val * const['h2']) - z_4
+            if x_d_hist is not None:
+                x_d_hist[k, :] = x_d
+            if x_d_peak is not None:
+                np.maximum(x_d_peak, np.fabs(x_d), out=x_d_peak)
+            if x_v_hist is not None:
+                x_v_hist[k, :] = x_v
+            if x_v_peak is not None:
+                np.maximum(x_v_peak, np.fabs(x_v), out=x_v_peak)
+            if need_accel:
+                x_a = (-const['f6'] * x_v) - (omega2 * x_d)
+                if x_a_hist is not None:
+                    x_a_hist[k, :] = x_a
+                if x_a_peak is not None:
+                    np.maximum(x_a_peak, np.fabs(x_a), out=x_a_peak)
+
+        for key in peaks:
+            if key in stored:
+                # no absolute copy of the whole history
+                tracked[key] = np.maximum(np.max(stored[key], axis=0),
+                                          -np.min(stored[key], axis=0))
+        if self.accel_factor != 1.:
+            for values in list(tracked.values()) + list(stored.values()):
+                values *= self.accel_factor
+        return tracked, stored
 
 
 PLOT_TYPE = {"loglog": lambda ax, x, y : ax.loglog(x, y),
@@ -20,20 +20,29 @@ def nextpow2(nval):
     m_i = np.ceil(m_f)
     return int(2.0 ** m_i)
 
-def convert_accel_units(acceleration, units):
+def get_accel_unit_factor(units):
     """
-    Converts acceleration to different units
+    Returns the factor converting acceleration in the given units to cm/s/s
     """
     if units=="g":
-        return 981. * acceleration
+        return 981.
     elif (units=="m/s/s") or (units=="m/s**2"):
-        return 100. * acceleration
+        return 100.
     elif (units=="cm/s/s") or (units=="cm/s**2"):
-        return acceleration
+        return 1.
     else:
         raise ValueError("Unrecognised time history units. "
                          "Should take either ''g'', ''m/s/s'' or ''cm/s/s''")
 
+def convert_accel_units(acceleration, units):
+    """
+    Converts acceleration to different units
+    """
+    factor = get_accel_unit_factor(units)
+    if factor == 1.:
+        return acceleration
+    return factor * acceleration
+
 def get_velocity_displacement(time_step, acceleration, units="cm/s/s"):
     '''
     Returns the velocity and displacment time series using simple integration
@@ -51,6 +60,39 @@ def get_velocity_displacement(time_step, acceleration, units="cm/s/s"):
     return velocity, displacement
 
 
+def get_rotated_peak_response(response_1, response_2, angles, max_elements=2 ** 20):
+    """
+    Returns the peak absolute response of the SDOF oscillator for every
+    rotation angle of two orthogonal horizontal components. As the oscillator
+    is linear, the response at angle theta is
+    response_1 * cos(theta) + response_2 * sin(theta), so the oscillators are
+    not re-run for each angle
+    :param numpy.ndarray response_1:
+        Oscillator response time series [Time, Period] of the first component
+    :param numpy.ndarray response_2:
+        Oscillator response time series [Time, Period] of the second component
+    :param numpy.ndarray angles:
+        Rotation angles (degrees)
+    :param int max_elements:
+        Maximum size of the [Angle, Time, Period] block evaluated at once
+    :returns:
+        Peak absolute response [Angle, Period]
+    """
+    angles = np.radians(np.asarray(angles, dtype=float))
+    cos_theta = np.cos(angles)[:, None, None]
+    sin_theta = np.sin(angles)[:, None, None]
+    num_steps, num_per = response_1.shape
+    # the blocks are contiguous time slices of the [Time, Period] histories
+    chunk_size = max(1, max_elements // (len(angles) * num_per))
+    peak_response = np.zeros([len(angles), num_per], dtype=float)
+    for i in range(0, num_steps, chunk_size):
+        block = cos_theta * response_1[None, i:i + chunk_size, :]
+        block += sin_theta * response_2[None, i:i + chunk_size, :]
+        np.fabs(block, out=block)
+        np.maximum(peak_response, np.max(block, axis=1), out=peak_response)
+    return peak_response
+
+
 def build_filename(filename, filetype='png', resolution=300):
     """
     Uses the input properties to create the string of the filename
@@ -0,0 +1,215 @@
+from pathlib import Path
+import json
+import os
+from obspy.core import Stream, Trace, UTCDateTime
+from obspy.core.compatibility import round_away
+import numpy as np
+from config import *
+import functions
+import utilities
+
+HEADER_FILE_NAME = "header.json"
+
+def get_filter_config() -> dict:
+    # the filtered samples of the store are only valid for this configuration
+    return {
+        "type": AppParameters.FILTER_TYPE.value,
+        "freqmin": AppParameters.FILTER_FREQ_MIN.value,
+        "freqmax": AppParameters.FILTER_FREQ_MAX.value,
+        "corners": AppParameters.FILTER_CORNERS.value
+    }
+
+def get_store_file_path(record_folder_path: Path, component: str, filtered: bool = False) -> Path:
+    if filtered:
+        return Path(record_folder_path) / f"{component}.filtered.npy"
+    return Path(record_folder_path) / f"{component}.npy"
+
+def write_store_header(record_folder_path: Path, header: dict) -> None:
+    # written to a temporary file and renamed, a crash never leaves a partial header
+    header = {**header, "starttime": str(header["starttime"])}
+    header_path = Path(record_folder_path) / HEADER_FILE_NAME
+    temporary_path = Path(record_folder_path) / f".{HEADER_FILE_NAME}.{os.getpid()}"
+    with open(temporary_path, "w") as file:
+        json.dump(header, file, indent=4)
+    os.replace(temporary_path, header_path)
+
+def write_filtered_store(record_folder_path: Path, stream: Stream, header: dict) -> tuple:
+    # the whole record is filtered once (like compute_record does before cutting the
+    # windows), the windows are then read from the filtered samples
+    stream, error = functions.pre_process_stream_array(stream)
+    if error is not None:
+        return None, f"Cannot preprocess the stream: {error}"
+
+    try:
+        for tr in stream.traces:
+            np.save(get_store_file_path(record_folder_path, tr.stats.component, filtered=True), np.require(tr.data, dtype=np.float64))
+
+        header = {**header, "filter": get_filter_config()}
+        write_store_header(record_folder_path, header)
+        return header, None
+    except Exception as e:
+        return None, str(e)
+
+def convert_txt_to_store(txt_file_path: Path, store_folder_path: Path = AppRoutes.STORE_FOLDER_PATH.value) -> tuple:
+    # one folder per record: header.json + one raw and one filtered .npy per component
+    stream, error = functions.create_stream_from_txt(txt_file_path)
+    if error is not None:
+        return None, error
+
+    try:
+        record_folder_path = Path(store_folder_path) / utilities.get_record_name(stream)
+        record_folder_path.mkdir(parents=True, exist_ok=True)
+
+        first_trace = stream.traces[0]
+        header = {
+            "station": first_trace.stats.station,
+            "starttime": first_trace.stats.starttime,
+            "sampling_rate": first_trace.stats.sampling_rate,
+            "npts": first_trace.stats.npts,
+            "components": [tr.stats.component for tr in stream.traces]
+        }
+
+        for tr in stream.traces:
+            np.save(get_store_file_path(record_folder_path, tr.stats.component), np.require(tr.data, dtype=np.float64))
+    except Exception as e:
+        return None, str(e)
+
+    # the header is written last, so a record folder without it is incomplete
+    _, error = write_filtered_store(record_folder_path, stream, header)
+    if error is not None:
+        return None, error
+
+    return record_folder_path, None
+
+def update_filtered_store(record_folder_path: Path) -> tuple:
+    # the filtered samples are recomputed from the raw ones when the filter configuration changed
+    try:
+        header = read_store_header(record_folder_path)
+    except Exception as e:
+        return None, str(e)
+
+    if header.get("filter") == get_filter_config():
+        return header, None
+
+    stream, error = create_stream_from_store(record_folder_path)
+    if error is not None:
+        return None, error
+
+    return write_filtered_store(record_folder_path, stream, header)
+
+def read_store_header(record_folder_path: Path) -> dict:
+    with open(Path(record_folder_path) / HEADER_FILE_NAME, "r") as file:
+        header = json.load(file)
+    header["starttime"] = UTCDateTime(header["starttime"])
+    return header
+
+def open_store(record_folder_path: Path, filtered: bool = False) -> tuple:
+    # the samples stay on disk, only the pages that are sliced are read
+    try:
+        header = read_store_header(record_folder_path)
+        if filtered and header.get("filter") != get_filter_config():
+            return None, "The filtered samples of the store do not match the filter configuration, run update_filtered_store first!"
+        data = {
+            c: np.load(get_store_file_path(record_folder_path, c, filtered), mmap_mode="r")
+            for c in header["components"]
+        }
+        return (header, data), None
+    except Exception as e:
+        return None, str(e)
+
+def create_stream_from_store(record_folder_path: Path, starttime_offset: float | None = None, endtime_offset: float | None = None, filtered: bool = False) -> tuple:
+    # offsets are in seconds from the first sample (like Parr & Sarr), both ends included
+    store, error = open_store(record_folder_path, filtered)
+    if error is not None:
+        return None, error
+
+    header, data = store
+    fs = header["sampling_rate"]
+    delta = 1.0 / fs
+    npts = header["npts"]
+    starttime = header["starttime"]
+
+    # nearest samples picked like Stream.trim(nearest_sample=True): half samples round away
+    # from zero, the start relative to the first sample and the end relative to the last one
+    start_index = 0
+    if starttime_offset is not None:
+        start_index = max(int(round_away(((starttime + starttime_offset) - starttime) * fs)), 0)
+
+    end_index = npts
+    if endtime_offset is not None:
+        endtime = starttime + (npts - 1) * delta
+        end_index = min(npts - 1 + int(round_away(((starttime + endtime_offset) - endtime) * fs)) + 1, npts)
+
+    window_starttime = starttime + start_index * delta
+
+    if start_index >= end_index:
+        return None, f"The requested window ({starttime_offset}-{endtime_offset}) is outside of the record!"
+
+    try:
+        traces = []
+        for c in header["components"]:
+            stats = {
+                "npts": end_index - start_index,
+                "sampling_rate": fs,
+                "station": header["station"],
+                "starttime": window_starttime,
+                "component": c
+            }
+            traces.append(Trace(data=np.array(data[c][start_index:end_index]), header=stats))
+
+        st = Stream(traces=traces)
+
+        error = utilities.validate_stream(st)
+
+        return st, error
+    except Exception as e:
+        return None, str(e)
+
+def read_noise_signal_windows(record_folder_path: Path, Parr: float, Sarr: float) -> tuple:
+    # same windows as functions.generate_noise_signal_windows on the preprocessed record,
+    # only the samples of the two windows are read from the filtered store
+    _, error = update_filtered_store(record_folder_path)
+    if error is not None:
+        return None, f"Cannot update the filtered samples of the store: {error}"
+
+    noise_trim_left = Parr - AppParameters.WINDOW_LENGTH.value - 1
+    noise_trim_right = Parr + 1
+    signal_trim_left = Sarr - 1
+    signal_trim_right = Sarr + AppParameters.WINDOW_LENGTH.value + 1
+
+    st_noise, error = create_stream_from_store(record_folder_path, noise_trim_left, noise_trim_right, filtered=True)
+    if error is not None:
+        return None, f"Cannot read the noise window from the store: {error}"
+
+    st_signal, error = create_stream_from_store(record_folder_path, signal_trim_left, signal_trim_right, filtered=True)
+    if error is not None:
+        return None, f"Cannot read the signal window from the store: {error}"
+
+    return (st_noise, st_signal), None
+
+def compute_store_fourier_spectra(record_folder_path: Path, Parr: float, Sarr: float) -> tuple:
+    # the FAS steps of pipeline.compute_record for new arrivals, without loading the whole record
+    ps_windows, error = read_noise_signal_windows(record_folder_path, Parr, Sarr)
+    if error is not None:
+        return None, error
+
+    st_noise, st_signal = ps_windows
+
+    processed_ps_windows, error = functions.process_noise_signal_arrays(st_noise, st_signal)
+    if error is not None:
+        return None, f"Cannot apply preprocessing steps to the noise and signal windows: {error}"
+
+    st_noise, st_signal = processed_ps_windows
+
+    spectra = []
+    for tr_noise, tr_signal in zip(st_noise.traces, st_signal.traces):
+        tr_noise_dict = functions.compute_fourier(tr_noise)
+        tr_signal_dict = functions.compute_fourier(tr_signal)
+
+        tr_signal_dict["fas_amps_snr"] = functions.apply_signal_to_noise_ratio(
+            tr_noise_dict["fas_amps_konno"], tr_signal_dict["fas_amps_konno"]
+        )
+
+        spectra.append((tr_noise_dict, tr_signal_dict, tr_noise.stats.channel))
+
+    return spectra, None
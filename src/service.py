@@ -0,0 +1,190 @@
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import io
+import json
+import threading
+import time
+from obspy import read as read_mseed
+import numpy as np
+import array_processing
+import functions
+import pipeline
+import utilities
+from config import *
+
+# Long-running local HTTP service: the imports, filter designs and Konno-Ohmachi
+# operators are paid once, each request only parses the record and computes.
+#   POST /spectra?format=txt|mseed&Parr=15&Sarr=30&rotd=0&output=json|npz  (record as body)
+#        Parr and Sarr (seconds from the first sample) are required
+#   GET  /stats  latency percentiles of the recent requests
+# At most SERVICE_MAX_CONCURRENT_REQUESTS records are computed at once, the others get 503.
+
+class LatencyTracker:
+    def __init__(self, max_samples: int = AppParameters.SERVICE_LATENCY_SAMPLES.value):
+        self.latencies = deque(maxlen=max_samples)
+        self.total_requests = 0
+        self.total_errors = 0
+        self.lock = threading.Lock()
+
+    def add(self, latency: float, error: bool = False) -> None:
+        with self.lock:
+            self.latencies.append(latency)
+            self.total_requests += 1
+            self.total_errors += int(error)
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            latencies = np.array(self.latencies)
+            stats = {"total_requests": self.total_requests, "total_errors": self.total_errors}
+
+        for percentile in [50, 90, 99]:
+            stats[f"p{percentile}_ms"] = float(np.percentile(latencies, percentile) * 1000) if len(latencies) > 0 else None
+        return stats
+
+LATENCY_TRACKER = LatencyTracker()
+# each computation holds a whole record (and its RotD histories), the requests above
+# the limit are rejected with 503 instead of queueing up in memory
+COMPUTE_SLOTS = threading.BoundedSemaphore(AppParameters.SERVICE_MAX_CONCURRENT_REQUESTS.value)
+
+def warm_up() -> None:
+    # build the cached operators before the first request arrives
+    functions.get_konno_ohmachi_matrix(
+        AppParameters.FOURIER_MIN_FREQ.value,
+        AppParameters.FOURIER_MAX_FREQ.value,
+        AppParameters.FOURIER_TOTAL_FREQS.value,
+        AppParameters.KONNO_OMACHI_BANDWIDTH.value
+    )
+    for fs in AppParameters.SERVICE_WARM_SAMPLING_RATES.value:
+        array_processing.filter_array(np.zeros((1, 2)), fs)
+
+def create_stream_from_payload(payload: bytes, record_format: str) -> tuple:
+    if record_format == "txt":
+        try:
+            file_contents = io.StringIO(payload.decode("utf-8")).readlines()
+        except Exception as e:
+            return None, f"Cannot decode the txt record: {str(e)}"
+        return functions.create_stream_from_txt_lines(file_contents)
+
+    if record_format == "mseed":
+        try:
+            stream = read_mseed(io.BytesIO(payload), format="MSEED")
+        except Exception as e:
+            return None, f"Cannot read the mseed record: {str(e)}"
+        return stream, utilities.validate_stream(stream)
+
+    return None, f"Unsupported record format '{record_format}', use 'txt' or 'mseed'"
+
+def get_json_value(value):
+    # NaN (e.g. the frequencies removed by the SNR filter) is not valid JSON
+    if isinstance(value, np.ndarray):
+        if value.ndim == 0:
+            return get_json_value(value.item())
+        return [get_json_value(v) for v in value.tolist()]
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+def compute_payload_spectra(payload: bytes, query: dict) -> tuple:
+    record_format = query.get("format", ["txt"])[0].lower()
+    stream, error = create_stream_from_payload(payload, record_format)
+    if error is not None:
+        return None, error
+
+    # the arrivals are not in the table of get_record_arrivals for unknown records
+    if "Parr" not in query or "Sarr" not in query:
+        return None, "The query parameters Parr and Sarr are required!"
+
+    try:
+        ps_arrivals = {"Parr": float(query["Parr"][0]), "Sarr": float(query["Sarr"][0])}
+    except ValueError as e:
+        return None, f"Invalid arrivals: {str(e)}"
+
+    compute_rotd = query.get("rotd", ["0"])[0] == "1"
+    return pipeline.compute_record(stream, ps_arrivals, compute_rotd)
+
+class SpectraRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if urlparse(self.path).path == "/stats":
+            self.send_json(200, LATENCY_TRACKER.get_stats())
+        else:
+            self.send_json(404, {"error": f"Unknown path '{self.path}'"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/spectra":
+            self.send_json(404, {"error": f"Unknown path '{self.path}'"})
+            return
+
+        if not COMPUTE_SLOTS.acquire(blocking=False):
+            # the body is not read, so the connection cannot be reused
+            self.close_connection = True
+            self.send_json(503, {"error": "The service is busy, retry later"}, {"Retry-After": "1"})
+            return
+
+        # the slot is held until the response is sent, the result stays in memory until then
+        try:
+            self.send_spectra(url)
+        finally:
+            COMPUTE_SLOTS.release()
+
+    def send_spectra(self, url) -> None:
+        start = time.perf_counter()
+        query = parse_qs(url.query)
+        payload = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        try:
+            result, error = compute_payload_spectra(payload, query)
+        except Exception as e:
+            result, error = None, str(e)
+
+        if error is not None:
+            handle_error(f"Cannot compute the spectra of the request: {error}")
+            LATENCY_TRACKER.add(time.perf_counter() - start, error=True)
+            self.send_json(400, {"error": error})
+            return
+
+        arrays = pipeline.get_record_result_arrays(result)
+        if query.get("output", ["json"])[0] == "npz":
+            buffer = io.BytesIO()
+            np.savez(buffer, **arrays)
+            self.send_body(200, buffer.getvalue(), "application/octet-stream")
+        else:
+            self.send_json(200, {
+                "record_name": utilities.get_record_name(result["stream"]),
+                "rotd_error": result["rotd_error"],
+                **{key: get_json_value(np.asarray(value)) for key, value in arrays.items()}
+            })
+
+        LATENCY_TRACKER.add(time.perf_counter() - start)
+
+    def send_json(self, status: int, content: dict, headers: dict | None = None) -> None:
+        self.send_body(status, json.dumps(content).encode("utf-8"), "application/json", headers)
+
+    def send_body(self, status: int, body: bytes, content_type: str, headers: dict | None = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.info(format % args)
+
+def run_service(host: str = AppParameters.SERVICE_HOST.value, port: int = AppParameters.SERVICE_PORT.value) -> None:
+    warm_up()
+    server = ThreadingHTTPServer((host, port), SpectraRequestHandler)
+    handle_info(f"Serving spectra on http://{host}:{port}...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    # the service needs no data folder, it only logs to the console
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    run_service()
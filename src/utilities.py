@@ -1,6 +1,7 @@
 from obspy.core import Stream
 from config import *
 import matplotlib.pyplot as plt
+import numpy as np
 
 def get_record_name(stream: Stream) -> str:
     first_trace = stream.traces[0]
@@ -72,31 +73,149 @@ def validate_arrivals(stream: Stream, ps_arrivals: dict) -> str | None:
         return error_message
     
 def plot_FAS_response_spectra(tr_noise_dict: dict, tr_signal_dict: dict, response_dict: dict, component: str):
-    fig, ax = plt.subplots(1, 1)
+    fig, ax, artists = _get_figure_template("fas", _create_fas_template)
     ax.set_title(f"FAS & Response Spectra, component: {component}")
-    ax.plot(tr_noise_dict["fas_freqs"], tr_noise_dict["fas_amps"], lw=1, color="gray", label=f"noise part")
-    ax.plot(tr_signal_dict["fas_freqs"], tr_signal_dict["fas_amps"], lw=1, color="red", label=f"signal part")
-    ax.scatter(tr_noise_dict["fas_freqs_interp"], tr_noise_dict["fas_amps_interp"], label=f"Interpolated fas", c="black", zorder=100)
-    ax.scatter(tr_signal_dict["fas_freqs_interp"], tr_signal_dict["fas_amps_interp"], label=f"Interpolated fas", c="black", zorder=100)
-    ax.plot(1/response_dict["spec"]["Period"], response_dict["spec"]["Pseudo-Velocity"]*0.1/9.81, label="response spectra (Velocity)")
-    ax.set_xscale("log")
-    ax.set_yscale("log")
-    ax.legend()
-    AppConfig.PLOTS_PDF.value.savefig(fig)
-    plt.close(fig)
+
+    total_bins = _get_total_bins(fig, ax)
+    artists["noise"].set_data(*minmax_decimate(tr_noise_dict["fas_freqs"], tr_noise_dict["fas_amps"], total_bins, log_x=True))
+    artists["signal"].set_data(*minmax_decimate(tr_signal_dict["fas_freqs"], tr_signal_dict["fas_amps"], total_bins, log_x=True))
+    artists["noise_interp"].set_offsets(np.column_stack([tr_noise_dict["fas_freqs_interp"], tr_noise_dict["fas_amps_interp"]]))
+    artists["signal_interp"].set_offsets(np.column_stack([tr_signal_dict["fas_freqs_interp"], tr_signal_dict["fas_amps_interp"]]))
+    artists["response"].set_data(1/response_dict["spec"]["Period"], response_dict["spec"]["Pseudo-Velocity"]*0.1/9.81)
+
+    # relim ignores the scatter points, they are added to the data limits explicitly
+    ax.relim()
+    for key in ["noise_interp", "signal_interp"]:
+        offsets = np.asarray(artists[key].get_offsets())
+        offsets = offsets[np.all(np.isfinite(offsets) & (offsets > 0), axis=1)]
+        if len(offsets) > 0:
+            ax.update_datalim(offsets)
+    ax.autoscale_view()
+
+    AppConfig.PLOTS_PDF.value.savefig(fig, dpi=AppParameters.PLOT_RASTER_DPI.value)
+
+def plot_rotd_response_spectra(rotd_dict: dict, record_name: str):
+    fig, ax, artists = _get_figure_template("rotd", _create_rotd_template)
+    ax.set_title(f"RotD50 & RotD100 Response Spectra - {record_name}", fontsize=10)
+    for rotd_type in ["RotD50", "RotD100"]:
+        artists[rotd_type].set_data(1/rotd_dict["period"], rotd_dict[rotd_type]["Pseudo-Velocity"]*0.1/9.81)
+
+    ax.relim()
+    ax.autoscale_view()
+
+    AppConfig.PLOTS_PDF.value.savefig(fig, dpi=AppParameters.PLOT_RASTER_DPI.value)
 
 def plot_stream(stream, title="", parr=None, sarr=None) -> None:
     record_name = get_record_name(stream)
-    fig, ax = plt.subplots(3, 1)
-    fig.suptitle(title + " - " + record_name, fontsize=10)
+    fig, ax, artists = _get_figure_template("stream", _create_stream_template)
+    artists["suptitle"].set_text(title + " - " + record_name)
+    show_arrivals = any([parr, sarr])
     for i in range(3):
         tr = stream.traces[i]
-        ax[i].plot(tr.times(), tr.data, lw=1, label=f"component: {tr.stats.component}")
+        line = artists["lines"][i]
+        line.set_data(*minmax_decimate(tr.times(), tr.data, _get_total_bins(fig, ax[i])))
+        line.set_label(f"component: {tr.stats.component}")
+
+        for key, arrival in [("parr", parr), ("sarr", sarr)]:
+            arrival_line = artists[key][i]
+            arrival_line.set_visible(show_arrivals)
+            if show_arrivals:
+                arrival_line.set_xdata([arrival, arrival])
+                arrival_line.set_label(key.capitalize())
+            else:
+                # labels starting with an underscore are left out of the legend
+                arrival_line.set_label(f"_{key}")
 
-        if any([parr, sarr]):
-            ax[i].axvline(x=parr, label="Parr", color="black", ls="--")
-            ax[i].axvline(x=sarr, label="Sarr", color="red", ls="--")
+        ax[i].relim(visible_only=True)
+        ax[i].autoscale_view()
         ax[i].legend(loc="upper right")
     
-    AppConfig.PLOTS_PDF.value.savefig(fig)
-    plt.close(fig)
\ No newline at end of file
+    AppConfig.PLOTS_PDF.value.savefig(fig, dpi=AppParameters.PLOT_RASTER_DPI.value)
+
+def minmax_decimate(x: np.ndarray, y: np.ndarray, total_bins: int, log_x: bool = False) -> tuple:
+    # keeps the min & max sample of each of total_bins equal-width bins of x (in order),
+    # which draws the same envelope as the full series at the output resolution
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    valid = np.isfinite(x) & (x > 0) if log_x else np.isfinite(x)
+    x = x[valid]
+    y = y[valid]
+
+    if len(x) <= 2 * total_bins:
+        return x, y
+
+    x_scaled = np.log10(x) if log_x else x
+    x_min, x_max = x_scaled[0], x_scaled[-1]
+    if x_max <= x_min:
+        return x, y
+
+    bin_ids = np.minimum(((x_scaled - x_min) / (x_max - x_min) * total_bins).astype(int), total_bins - 1)
+    bin_starts = np.flatnonzero(np.r_[True, bin_ids[1:] != bin_ids[:-1]])
+    bin_sizes = np.diff(np.r_[bin_starts, len(x)])
+
+    indices = np.arange(len(x))
+    bin_min = np.repeat(np.minimum.reduceat(y, bin_starts), bin_sizes)
+    bin_max = np.repeat(np.maximum.reduceat(y, bin_starts), bin_sizes)
+    first_min = np.minimum.reduceat(np.where(y == bin_min, indices, len(x)), bin_starts)
+    first_max = np.minimum.reduceat(np.where(y == bin_max, indices, len(x)), bin_starts)
+
+    keep = np.unique(np.r_[first_min, first_max, 0, len(x) - 1])
+    return x[keep], y[keep]
+
+_FIGURE_TEMPLATES = {}
+
+def _get_figure_template(layout: str, create_template) -> tuple:
+    # one figure per layout, the plots only update the data of its artists
+    if layout not in _FIGURE_TEMPLATES:
+        _FIGURE_TEMPLATES[layout] = create_template()
+    return _FIGURE_TEMPLATES[layout]
+
+def _get_total_bins(fig, ax) -> int:
+    # horizontal resolution of the axes in the saved figure
+    return max(1, int(ax.get_position().width * fig.get_figwidth() * AppParameters.PLOT_RASTER_DPI.value))
+
+def _create_stream_template() -> tuple:
+    fig, ax = plt.subplots(3, 1)
+    artists = {
+        "suptitle": fig.suptitle("", fontsize=10),
+        "lines": [],
+        "parr": [],
+        "sarr": []
+    }
+    for i in range(3):
+        line, = ax[i].plot([], [], lw=1)
+        artists["lines"].append(line)
+        artists["parr"].append(ax[i].axvline(x=0, color="black", ls="--", visible=False))
+        artists["sarr"].append(ax[i].axvline(x=0, color="red", ls="--", visible=False))
+    return fig, ax, artists
+
+def _create_fas_template() -> tuple:
+    fig, ax = plt.subplots(1, 1)
+    noise, = ax.plot([], [], lw=1, color="gray", label=f"noise part")
+    signal, = ax.plot([], [], lw=1, color="red", label=f"signal part")
+    artists = {
+        "noise": noise,
+        "signal": signal,
+        "noise_interp": ax.scatter([], [], label=f"Interpolated fas", c="black", zorder=100),
+        "signal_interp": ax.scatter([], [], label=f"Interpolated fas", c="black", zorder=100)
+    }
+    artists["response"], = ax.plot([], [], label="response spectra (Velocity)")
+    ax.set_xscale("log")
+    ax.set_yscale("log")
+    ax.legend()
+    return fig, ax, artists
+
+def _create_rotd_template() -> tuple:
+    fig, ax = plt.subplots(1, 1)
+    artists = {}
+    artists["RotD50"], = ax.plot([], [], lw=1, color="black", label="RotD50 (Velocity)")
+    artists["RotD100"], = ax.plot([], [], lw=1, color="red", label="RotD100 (Velocity)")
+    ax.set_xscale("log")
+    ax.set_yscale("log")
+    ax.legend()
+    return fig, ax, artists
+
+def close_figure_templates() -> None:
+    for fig, _, _ in _FIGURE_TEMPLATES.values():
+        plt.close(fig)
+    _FIGURE_TEMPLATES.clear()